@@ -1,11 +1,18 @@
 import streamlit as st
 import os
-import json
+import io
+import time
+import hashlib
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from PIL import Image
-import google.generativeai as genai
-from groq import Groq
+
+# Heavy SDK imports (groq, google.generativeai, PIL) are deferred to first use -
+# Streamlit re-executes this file on every widget change, so keeping them out of
+# the module top level cuts rerun latency for pages that never touch them.
 
 # ==========================================
 # 1. CONFIGURATION & SECRETS
@@ -32,8 +39,10 @@ GROQ_API_KEY = get_secret("GROQ_API_KEY")
 DEFAULT_CITY = "Sialkot"
 DEFAULT_COUNTRY = "PK"
 
-# Custom CSS
-st.markdown("""
+# Custom CSS - module-level constant so the string isn't rebuilt each rerun.
+# It must still be emitted every run: Streamlit replaces the DOM per rerun, so a
+# session-gated st.markdown would drop the styles after the first interaction.
+CSS = """
 <style>
     .stApp {background: linear-gradient(135deg, #1b5e20 0%, #2e7d32 25%, #4caf50 50%, #66bb6a 75%, #81c784 100%); background-attachment: fixed;}
     .main .block-container {background: rgba(255, 255, 255, 0.95); border-radius: 20px; padding: 2rem; margin-top: 1rem;}
@@ -43,61 +52,147 @@ st.markdown("""
     section[data-testid="stSidebar"] {background: linear-gradient(180deg, #1b5e20 0%, #2e7d32 100%);}
     section[data-testid="stSidebar"] * {color: white !important;}
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CSS, unsafe_allow_html=True)
+
+# Card template as a module constant - one format() per plant, one markdown delta for all cards
+PLANT_CARD = """
+<div class="plant-card">
+    <div style="display:flex; justify-content:space-between;">
+        <h3>{name}</h3>
+        <span style="background:{color}; color:white; padding:5px 10px; border-radius:10px;">{text}</span>
+    </div>
+    <p>📍 {placement} | ☀️ {sun}</p>
+</div>
+"""
 
 # ==========================================
 # 2. BACKEND SERVICES (LOGIC CLASSES)
 # ==========================================
 
+@st.cache_data(ttl=60)
+def _load_user_profile():
+    """Cached profile read - writers call .clear() after saving"""
+    if os.path.exists("user_profile.json"):
+        with open("user_profile.json", "rb") as f: return orjson.loads(f.read())
+    return {"name": "", "email": "", "location": DEFAULT_CITY}
+
+
+@st.cache_data(ttl=60)
+def _load_chat_history(limit):
+    """Cached chat history read - writers call .clear() after appending"""
+    if os.path.exists("chat_history.jsonl"):
+        # Bounded tail read - only the last `limit` lines are parsed
+        with open("chat_history.jsonl", "rb") as f:
+            return [orjson.loads(line) for line in deque(f, maxlen=limit)]
+    # Legacy full-file history from before the append-only log
+    if not os.path.exists("chat_history.json"): return []
+    with open("chat_history.json", "rb") as f:
+        return orjson.loads(f.read())[-limit:]
+
+
 class DataManager:
     """Handles saving/loading plants to a simple JSON file"""
     def __init__(self, db_file='plants_db.json'):
         self.db_file = db_file
-    
+        self._cache = None   # in-memory plants list, keyed off file mtime
+        self._mtime = None
+        self._idx = {}       # plant id -> position in self._cache
+
+    def _rebuild_idx(self):
+        self._idx = {p.get('id'): i for i, p in enumerate(self._cache or [])}
+
+    def _parse_watered(self, plants):
+        """Parse last_watered into a datetime once per load, not per interval check"""
+        for p in plants:
+            lw = p.get('last_watered')
+            try: p['_lw'] = datetime.fromisoformat(str(lw)) if lw else None
+            except: p['_lw'] = None
+
+    def _save_plants(self, plants):
+        # Write to a temp file and swap in atomically so a crash can't leave a half-written DB
+        # (underscore keys are in-memory only and never hit disk)
+        records = [{k: v for k, v in p.items() if not k.startswith('_')} for p in plants]
+        tmp = self.db_file + '.tmp'
+        with open(tmp, 'wb') as f: f.write(orjson.dumps(records))
+        os.replace(tmp, self.db_file)
+        self._cache = plants
+        self._mtime = os.path.getmtime(self.db_file)
+        self._rebuild_idx()
+
     def get_all_plants(self):
         if not os.path.exists(self.db_file): return []
         try:
-            with open(self.db_file, 'r') as f: return json.load(f)
+            mtime = os.path.getmtime(self.db_file)
+            if self._cache is not None and mtime == self._mtime:
+                return self._cache
+            with open(self.db_file, 'rb') as f: self._cache = orjson.loads(f.read())
+            self._parse_watered(self._cache)
+            self._mtime = mtime
+            self._rebuild_idx()
+            return self._cache
         except: return []
 
     def add_plant(self, plant_data):
         plants = self.get_all_plants()
-        plant_data['id'] = int(datetime.now().timestamp()) # Unique ID
+        plant_data['id'] = time.time_ns() # Unique ID - second-precision timestamps collide on double-tap
+        self._parse_watered([plant_data])
         plants.append(plant_data)
-        with open(self.db_file, 'w') as f: json.dump(plants, f)
+        self._save_plants(plants)
         return plant_data
 
     def delete_plant(self, plant_id):
         plants = self.get_all_plants()
-        plants = [p for p in plants if p.get('id') != plant_id]
-        with open(self.db_file, 'w') as f: json.dump(plants, f)
+        i = self._idx.get(plant_id)
+        if i is None: return
+        del plants[i]
+        self._save_plants(plants)
 
     def mark_watered(self, plant_id):
         plants = self.get_all_plants()
-        for p in plants:
-            if p.get('id') == plant_id:
-                p['last_watered'] = datetime.now().isoformat()
-        with open(self.db_file, 'w') as f: json.dump(plants, f)
+        i = self._idx.get(plant_id)
+        if i is None: return
+        now = datetime.now()
+        plants[i]['last_watered'] = now.isoformat()
+        plants[i]['_lw'] = now
+        self._save_plants(plants)
 
     def get_user_profile(self):
         # Mock profile for hackathon (or save to json if needed)
-        if os.path.exists("user_profile.json"):
-            with open("user_profile.json", "r") as f: return json.load(f)
-        return {"name": "", "email": "", "location": DEFAULT_CITY}
+        return _load_user_profile()
 
     def save_user_profile(self, data):
-        with open("user_profile.json", "w") as f: json.dump(data, f)
-    
+        with open("user_profile.json", "wb") as f: f.write(orjson.dumps(data))
+        _load_user_profile.clear()
+
     def get_chat_history(self, limit=10):
-        if not os.path.exists("chat_history.json"): return []
-        with open("chat_history.json", "r") as f: 
-            hist = json.load(f)
-            return hist[-limit:]
-            
+        return _load_chat_history(limit)
+
     def add_chat_message(self, user_msg, bot_msg, context=""):
-        hist = self.get_chat_history(100)
-        hist.append({"user_message": user_msg, "bot_response": bot_msg, "context": context})
-        with open("chat_history.json", "w") as f: json.dump(hist, f)
+        entry = {"user_message": user_msg, "bot_response": bot_msg, "context": context}
+        with open("chat_history.jsonl", "ab") as f:
+            f.write(orjson.dumps(entry) + b"\n")
+        _load_chat_history.clear()
+
+
+# Shared HTTP session - keeps connections alive so repeat API calls skip the TCP/TLS handshake
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _fetch_weather(city, api_key):
+    """Cached weather fetch - one network call per city per 10 minutes"""
+    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
+    data = SESSION.get(url, timeout=5).json()
+    if data.get("cod") != 200: return None
+    return {
+        "temperature": data['main']['temp'],
+        "description": data['weather'][0]['description'],
+        "humidity": data['main']['humidity'],
+        "icon": data['weather'][0]['icon'],
+        "is_raining": data['weather'][0]['main'] == 'Rain' # canonical enum, computed once
+    }
 
 
 class WeatherService:
@@ -105,15 +200,7 @@ class WeatherService:
     def get_current_weather(self, city):
         if not OPENWEATHER_API_KEY: return {"temperature": 25, "description": "No Key"}
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={OPENWEATHER_API_KEY}&units=metric"
-            data = requests.get(url).json()
-            if data.get("cod") != 200: return None
-            return {
-                "temperature": data['main']['temp'],
-                "description": data['weather'][0]['description'],
-                "humidity": data['main']['humidity'],
-                "icon": data['weather'][0]['icon']
-            }
+            return _fetch_weather(city, OPENWEATHER_API_KEY)
         except: return None
 
     def get_forecast(self, city, days=2):
@@ -121,36 +208,81 @@ class WeatherService:
         return []
 
 
+@st.cache_resource
+def get_groq_client():
+    """One Groq client per process - avoids rebuilding the httpx pool every chat turn"""
+    from groq import Groq
+    return Groq(api_key=GROQ_API_KEY)
+
+
 class GroqService:
     """Handles Chatbot (Fast)"""
-    def chat_about_plant(self, query, context):
+    def chat_about_plant(self, query, context, stream=False, model=None):
         if not GROQ_API_KEY: return "⚠️ Groq API Key missing."
+        if model is None:
+            # 8B on Groq is ~10x faster and plenty for plant-care Q&A; long queries escalate to 70B
+            model = "llama-3.3-70b-versatile" if len(query) > 300 else "llama-3.1-8b-instant"
         try:
-            client = Groq(api_key=GROQ_API_KEY)
+            client = get_groq_client()
             completion = client.chat.completions.create(
                 messages=[
                     {"role": "system", "content": f"You are an expert botanist. Context: {context}. Keep answers short and helpful."},
                     {"role": "user", "content": query}
                 ],
-                model="llama-3.3-70b-versatile",
+                model=model,
+                stream=stream,
             )
+            if stream:
+                # Generator of text deltas - caller renders them as they arrive
+                return (chunk.choices[0].delta.content or "" for chunk in completion)
             return completion.choices[0].message.content
         except Exception as e:
             return f"AI Error: {e}"
 
 
+@st.cache_resource
+def _executor():
+    """Shared worker pool for overlapping independent network calls"""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+@st.cache_resource
+def _recognizer():
+    """One speech recognizer per process - keeps energy-threshold state across chat turns"""
+    import speech_recognition as sr
+    return sr.Recognizer()
+
+
+@st.cache_resource
+def _gemini_model():
+    """Configure the SDK and build the model handle once per process"""
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+
+@st.cache_data(show_spinner=False)
+def _identify_cached(img_hash, _img_bytes):
+    """Memoized Gemini identification - keyed by content hash, bytes excluded from the key"""
+    from PIL import Image
+    image = Image.open(io.BytesIO(_img_bytes)).convert('RGB')
+    # Phone photos are often 3-12 MP; 1024px is plenty for identification
+    # and shrinks the upload payload by an order of magnitude
+    image.thumbnail((1024, 1024), Image.LANCZOS)
+    response = _gemini_model().generate_content(["Identify this plant name only.", image])
+    return {"plant_name": response.text.strip()}
+
+
 class HuggingFaceService:
     """Handles Image Identification"""
-    def identify_plant(self, image):
+    def identify_plant(self, image_bytes):
         # Using Google Gemini as fallback if HF is complex to setup in one file
         # or implement simple HF API call here
         if not GEMINI_API_KEY: return {"plant_name": "API Key Missing"}
-        
+
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(["Identify this plant name only.", image])
-            return {"plant_name": response.text.strip()}
+            img_hash = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+            return _identify_cached(img_hash, image_bytes)
         except Exception as e:
             return {"plant_name": "Unknown Plant"}
 
@@ -171,11 +303,27 @@ class PlantService:
                 needs_water = True
         
         # Weather Logic Override
-        if weather and 'rain' in weather.get('description', '').lower():
+        if weather and weather.get('is_raining'):
             needs_water = False # Don't water if raining
-        
+
         return {"needs_water": needs_water}
 
+    def calculate_batch(self, plants, weather):
+        """Watering status for all plants in one pass - now/rain computed once, not per plant"""
+        now = datetime.now()
+        raining = bool(weather) and bool(weather.get('is_raining'))
+        statuses = []
+        for p in plants:
+            last_date = p.get('_lw') # pre-parsed by DataManager on load
+            if last_date is not None:
+                needs_water = (now - last_date).days >= int(p.get('watering_interval_days', 1))
+            else:
+                needs_water = True
+            if raining:
+                needs_water = False # Don't water if raining
+            statuses.append({"needs_water": needs_water})
+        return statuses
+
 
 # Initialize all services
 data_manager = DataManager()
@@ -184,6 +332,14 @@ groq_service = GroqService()
 huggingface_service = HuggingFaceService()
 plant_service = PlantService()
 
+def _session_weather(city):
+    """Weather for this session, keyed by (city, minute) - button-click reruns stay in RAM"""
+    key = (city, datetime.now().strftime("%Y%m%d%H%M"))
+    if st.session_state.get('_wx_key') != key:
+        st.session_state['_wx'] = weather_service.get_current_weather(city)
+        st.session_state['_wx_key'] = key
+    return st.session_state['_wx']
+
 # ==========================================
 # 3. MAIN UI LOGIC
 # ==========================================
@@ -197,6 +353,7 @@ if 'chat_history' not in st.session_state: st.session_state.chat_history = data_
 with st.sidebar:
     st.header("🌱 Smart Garden")
     page = st.radio("Navigate", ["🏠 Welcome", "👤 User Profile", "📍 Location", "📊 Dashboard", "🌱 Add Plant", "🤖 AI Botanist"])
+    ai_mode = st.radio("AI Mode", ["⚡ Fast", "🎯 Quality"], horizontal=True)
 
 # --- PAGE: WELCOME ---
 if page == "🏠 Welcome":
@@ -233,8 +390,8 @@ elif page == "📍 Location":
 elif page == "📊 Dashboard":
     st.title("🌿 Dashboard")
     city = st.session_state.user_location.get('city', DEFAULT_CITY)
-    weather = weather_service.get_current_weather(city)
-    
+    weather = _session_weather(city)
+
     if weather:
         st.markdown(f"""
         <div class="weather-banner">
@@ -247,28 +404,28 @@ elif page == "📊 Dashboard":
     if not st.session_state.plants:
         st.warning("No plants yet.")
     else:
+        statuses = plant_service.calculate_batch(st.session_state.plants, weather)
+        # One markdown call for all cards - one websocket delta instead of one per plant
+        html = "".join(
+            PLANT_CARD.format(
+                name=p['name'],
+                color="#f44336" if s['needs_water'] else "#4caf50",
+                text="Needs Water" if s['needs_water'] else "Happy",
+                placement=p['placement'],
+                sun=p['sun_preference']
+            )
+            for p, s in zip(st.session_state.plants, statuses)
+        )
+        st.markdown(html, unsafe_allow_html=True)
+
         cols = st.columns(2)
         for i, p in enumerate(st.session_state.plants):
             with cols[i%2]:
-                status = plant_service.calculate_watering_schedule(p['name'], p['watering_interval_days'], p['last_watered'], weather, None)
-                color = "#f44336" if status['needs_water'] else "#4caf50"
-                text = "Needs Water" if status['needs_water'] else "Happy"
-                
-                st.markdown(f"""
-                <div class="plant-card">
-                    <div style="display:flex; justify-content:space-between;">
-                        <h3>{p['name']}</h3>
-                        <span style="background:{color}; color:white; padding:5px 10px; border-radius:10px;">{text}</span>
-                    </div>
-                    <p>📍 {p['placement']} | ☀️ {p['sun_preference']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                if st.button("💧 Water", key=f"w{i}"):
+                if st.button(f"💧 Water {p['name']}", key=f"w{i}"):
                     data_manager.mark_watered(p['id'])
                     st.session_state.plants = data_manager.get_all_plants()
                     st.rerun()
-                if st.button("🗑️ Delete", key=f"d{i}"):
+                if st.button(f"🗑️ Delete {p['name']}", key=f"d{i}"):
                     data_manager.delete_plant(p['id'])
                     st.session_state.plants = data_manager.get_all_plants()
                     st.rerun()
@@ -285,7 +442,7 @@ elif page == "🌱 Add Plant":
         st.image(uploaded, width=200)
         if st.button("🔍 Identify AI"):
             with st.spinner("Analyzing..."):
-                res = huggingface_service.identify_plant(Image.open(uploaded))
+                res = huggingface_service.identify_plant(uploaded.getvalue())
                 ai_name = res.get('plant_name')
                 st.success(f"Identified: {ai_name}")
 
@@ -318,7 +475,7 @@ elif page == "🤖 AI Botanist":
     if audio:
         try:
             import speech_recognition as sr
-            r = sr.Recognizer()
+            r = _recognizer()
             with sr.AudioFile(audio) as source:
                 data = r.record(source)
                 final_q = r.recognize_google(data)
@@ -327,12 +484,35 @@ elif page == "🤖 AI Botanist":
     if user_in: final_q = user_in
     
     if final_q:
+        # Weather is independent of the query - fetch it while the user message renders,
+        # unless this session already has a fresh value for the current minute
+        city = st.session_state.user_location.get('city', DEFAULT_CITY)
+        wx_key = (city, datetime.now().strftime("%Y%m%d%H%M"))
+        fw = None
+        if st.session_state.get('_wx_key') != wx_key:
+            fw = _executor().submit(weather_service.get_current_weather, city)
         with st.chat_message("user"): st.write(final_q)
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                city = st.session_state.user_location.get('city', DEFAULT_CITY)
-                weather = weather_service.get_current_weather(city)
+                if fw:
+                    try: st.session_state['_wx'] = fw.result(timeout=5)
+                    except: st.session_state['_wx'] = None
+                    st.session_state['_wx_key'] = wx_key
+                weather = st.session_state.get('_wx')
                 ctx = f"Location: {city}. Weather: {weather}."
-                ans = groq_service.chat_about_plant(final_q, ctx)
-                st.write(ans)
+                model = "llama-3.3-70b-versatile" if ai_mode == "🎯 Quality" else None
+                ans = groq_service.chat_about_plant(final_q, ctx, stream=True, model=model)
+                if isinstance(ans, str): # error / missing key path
+                    st.write(ans)
+                else:
+                    placeholder = st.empty()
+                    full = ""
+                    try:
+                        for delta in ans:
+                            full += delta
+                            placeholder.markdown(full)
+                    except Exception as e:
+                        full += f"\n\nAI Error: {e}"
+                        placeholder.markdown(full)
+                    ans = full
                 data_manager.add_chat_message(final_q, ans, ctx)